@@ -1,17 +1,25 @@
 import argparse
 from email.mime import base
 import os
+import queue
 import re
 import subprocess
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
-from urllib.parse import urlparse, urljoin, urlunparse, urlencode, urlsplit, urlunsplit, parse_qsl
+from xml.sax.saxutils import escape as xml_escape
+from urllib.parse import ParseResult, urlparse, urljoin, urlunparse, urlencode, urlsplit, urlunsplit, parse_qsl
 import json
 from datetime import datetime
-import requests
+import httpx
 import shutil
-import urllib3
+
+try:
+    import orjson  # optional: schnellerer JSON-Encoder für die Failure-Logs
+except ImportError:
+    orjson = None
 
 
 # Programm welches eine einzelne ABAP Quelle von einem ADT Server holt,
@@ -19,16 +27,54 @@ import urllib3
 # oder zurück ins SAP Objekt schreibt (writeback).
 CLEANER_DEFAULT = r"C:\Tools\abap-cleaner-standalone\abapcleaner\abap-cleanerc.exe"
 SAP_CLIENT_DEFAULT = "001"
+# Obergrenze paralleler Objekte, damit auf dem SAP-Server nicht alle Dialog-Workprozesse belegt werden
+WORKERS_MAX_DEFAULT = 8
+# Maximale Länge einer Kommandozeile unter Windows (CreateProcess: 32767 Zeichen), mit Reserve
+CMDLINE_MAX = 32000
+# Timeout je HTTP-Request in Sekunden (Aktivierung großer Objekte kann dauern)
+HTTP_TIMEOUT = 120.0
+# Objekte je Aktivierungs-POST (begrenzt die Größe des XML-Bodys)
+ACTIVATION_CHUNK_SIZE = 50
+# Timeout eines Aktivierungs-POSTs: HTTP_TIMEOUT je Objekt, aber höchstens 10 Minuten
+# (ohne Deckel wären es bei ACTIVATION_CHUNK_SIZE Objekten 6000 s Wartezeit für einen hängenden Batch)
+ACTIVATION_TIMEOUT_MAX = 600.0
+
+# Rahmen des Activation-Bodys; je Objekt wird nur noch eine objectReference-Zeile eingefügt
+_ACT_XML_PREFIX = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<adtcore:objectReferences xmlns:adtcore="http://www.sap.com/adt/core">\n'
+)
+_ACT_XML_SUFFIX = b'</adtcore:objectReferences>\n'
+
+# Zeichen, die in Dateinamen (Windows) nicht erlaubt sind
+_UNSAFE_FN_RE = re.compile(r'[<>:"/\\|?*\x00-\x1F]')
+# Transportauftrag aus ADT-Lock-Fehlermeldungen
+_LOCK_CORRNR_RE = re.compile(r"locked in request\s+([A-Z0-9]{10})")
+
+# ADT-Pfadsegmente, auf die direkt der Objektname folgt (z.B. /oo/classes/ZCL_FOO):
+# erstes Segment -> erlaubte zweite Segmente
+_ADT_MARKER_SECOND = {
+    "programs": frozenset({"programs"}),
+    "oo": frozenset({"classes", "interfaces"}),
+    "ddic": frozenset({"tables", "structures", "dataelements", "domains"}),
+}
 
 
 @dataclass(frozen=True)
 class SourceItem:
     url: str          # absolute URL to ADT source/main (or other text endpoint)
-    label: str        # for output naming / logging
+    label: str        # for output naming / logging (already passed through safe_filename)
 
 
 def safe_filename(s: str) -> str:
-    return re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", s).strip(" .") or "unnamed"
+    return _UNSAFE_FN_RE.sub("_", s).strip(" .") or "unnamed"
+
+
+def _dumps(o) -> str:
+    if orjson is not None:
+        return orjson.dumps(o).decode("utf-8")
+    # gleiche kompakte Ausgabe wie orjson, damit das Logformat nicht vom installierten Paket abhängt
+    return json.dumps(o, ensure_ascii=False, separators=(",", ":"))
 
 
 def run_cmd(cmd: list[str]) -> subprocess.CompletedProcess:
@@ -37,45 +83,43 @@ def run_cmd(cmd: list[str]) -> subprocess.CompletedProcess:
 
 
 def run_cleaner(cleaner_exe: str, profile: Path, release: str, source: str) -> str:
-    if not Path(cleaner_exe).exists():
-        raise FileNotFoundError(f"Cleaner nicht gefunden: {cleaner_exe}")
-    if not profile.exists():
-        raise FileNotFoundError(f"Profil nicht gefunden: {profile}")
-
-    with tempfile.TemporaryDirectory() as td:
-        td = Path(td)
-        src = td / "in.abap"
-        src.write_text(source, encoding="utf-8")
-
-        cmd = [
-            cleaner_exe,
-            "--sourcefile", str(src),
-            "--profile", str(profile),
-            "--release", str(release),
-        ]
-        res = run_cmd(cmd)
+    # cleaner_exe und profile werden einmalig in main() auf Existenz geprüft
+    args = ["--profile", str(profile), "--release", str(release)]
 
-        # stderr/stdout: bytes -> str
-        stderr_b = res.stderr or b""
-        stdout_b = res.stdout or b""
+    # abap-cleanerc liest nicht von stdin; die Quelle geht daher direkt per --source
+    # auf die Kommandozeile. Nur wenn das Windows-Limit überschritten würde, Umweg über Datei.
+    cmd = [cleaner_exe, "--source", source, *args]
+    if len(subprocess.list2cmdline(cmd)) <= CMDLINE_MAX:
+        res = run_cmd(cmd)
+    else:
+        # Einzelne Datei im System-Temp statt eigenem Verzeichnis (kein mkdir/rmtree je Item);
+        # vor dem Aufruf schließen, sonst kann der Cleaner sie unter Windows nicht öffnen
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".abap", delete=False) as f:
+            f.write(source)
+        try:
+            res = run_cmd([cleaner_exe, "--sourcefile", f.name, *args])
+        finally:
+            os.unlink(f.name)
 
-        def decode_best(b: bytes) -> str:
-            try:
-                return b.decode("utf-8")
-            except UnicodeDecodeError:
-                return b.decode("cp1252", errors="replace")
+    # stdout/stderr sind bei capture_output immer bytes; stderr wird nur im Fehlerfall dekodiert
+    def decode_best(b: bytes) -> str:
+        # abap-cleanerc schreibt unter Windows in eine Pipe ggf. cp1252 (z.B. Umlaute in Kommentaren)
+        try:
+            return b.decode("utf-8")
+        except UnicodeDecodeError:
+            return b.decode("cp1252", errors="replace")
 
-        stderr_s = decode_best(stderr_b)
-        stdout_s = decode_best(stdout_b)
+    out = decode_best(res.stdout)
 
-        if res.returncode != 0:
-            raise RuntimeError(f"Cleaner failed rc={res.returncode}\n{stderr_s}\n{stdout_s}")
+    if res.returncode != 0:
+        stderr_s = decode_best(res.stderr)
+        raise RuntimeError(f"Cleaner failed rc={res.returncode}\n{stderr_s}\n{out}")
 
-        out = stdout_s
-        if not out.strip():
-            raise RuntimeError(f"Cleaner returned empty output.\nSTDERR:\n{stderr_s[:800]}")
+    if not out.strip():
+        stderr_s = decode_best(res.stderr)
+        raise RuntimeError(f"Cleaner returned empty output.\nSTDERR:\n{stderr_s[:800]}")
 
-        return out
+    return out
 
 
 
@@ -88,7 +132,12 @@ def headers(client: str, accept: str) -> dict:
     }
 
 
-def adt_get_text_and_etag(session: requests.Session, url: str, client: str) -> tuple[str, str | None]:
+def body_head(r: httpx.Response, limit: int = 4000) -> str:
+    # Nur den Anfang dekodieren; NetWeaver-Fehlerseiten können sehr groß sein
+    return r.content[:limit].decode(r.encoding or "utf-8", errors="replace")
+
+
+def adt_get_text_and_etag(session: httpx.Client, url: str, client: str) -> tuple[str, str | None]:
     r = session.get(url, headers=headers(client, "text/plain, */*"))
     r.raise_for_status()
 
@@ -104,7 +153,7 @@ def adt_get_text_and_etag(session: requests.Session, url: str, client: str) -> t
 
 
 
-def fetch_csrf_token(session: requests.Session, any_adt_url: str, client: str) -> str:
+def fetch_csrf_token(session: httpx.Client, any_adt_url: str, client: str) -> str:
     h = headers(client, "text/plain, */*")
     h["X-CSRF-Token"] = "Fetch"
     r = session.get(any_adt_url, headers=h)
@@ -116,41 +165,68 @@ def fetch_csrf_token(session: requests.Session, any_adt_url: str, client: str) -
     return token
 
 
-def adt_put_text(session: requests.Session, url: str, client: str, text: str, csrf_token: str, etag: str | None):
+# Schützt den an der Session gecachten Token, wenn mehrere Worker gleichzeitig nachladen
+_csrf_lock = threading.Lock()
+
+
+def get_csrf(session: httpx.Client, url: str, client: str, stale: str | None = None) -> str:
+    """
+    Liefert den an der Session gecachten X-CSRF-Token; geholt wird nur beim ersten Aufruf
+    oder wenn der gecachte Token dem vom Server abgelehnten (stale) entspricht.
+    """
+    with _csrf_lock:
+        token = getattr(session, "_csrf_token", None)
+        if token is None or token == stale:
+            fetch_url = getattr(session, "_csrf_url", None) or url
+            token = fetch_csrf_token(session, fetch_url, client)
+            session._csrf_token = token
+            session._csrf_url = fetch_url
+        return token
+
+
+def csrf_request(session: httpx.Client, method: str, url: str, client: str, h: dict, data: bytes | None = None,
+                 timeout: float = HTTP_TIMEOUT):
+    h["X-CSRF-Token"] = get_csrf(session, url, client)
+    r = session.request(method, url, headers=h, content=data, timeout=timeout)
+
+    # Token abgelaufen (403 + "X-CSRF-Token: Required"): einmal neu holen, genau einmal wiederholen
+    if r.status_code == 403 and r.headers.get("x-csrf-token", "").lower() == "required":
+        h["X-CSRF-Token"] = get_csrf(session, url, client, stale=h["X-CSRF-Token"])
+        r = session.request(method, url, headers=h, content=data, timeout=timeout)
+    return r
+
+
+def adt_put_text(session: httpx.Client, url: str, client: str, text: str, etag: str | None):
     h = headers(client, "text/plain, */*")
     h["Content-Type"] = "text/plain; charset=utf-8"
-    h["X-CSRF-Token"] = csrf_token
     h["If-Match"] = etag if etag else "*"
 
-    r = session.put(url, headers=h, data=text.encode("utf-8"))
+    r = csrf_request(session, "PUT", url, client, h, text.encode("utf-8"))
 
     if r.status_code >= 400:
         raise RuntimeError(
-            f"PUT failed {r.status_code} {r.reason}\n"
+            f"PUT failed {r.status_code} {r.reason_phrase}\n"
             f"URL: {url}\n"
-            f"Response headers: {dict(r.headers)}\n"
-            f"Response body:\n{r.text[:4000]}"
+            f"Response headers: {r.headers}\n"
+            f"Response body:\n{body_head(r)}"
         )
     return r
 
 
-def is_absolute_url(s: str) -> bool:
-    try:
-        p = urlparse(s)
-        return bool(p.scheme and p.netloc)
-    except Exception:
-        return False
-    
-def add_query_param(url: str, key: str, value: str) -> str:
+def is_absolute_url_fast(p: ParseResult) -> bool:
+    return bool(p.scheme and p.netloc)
+
+def add_query_params(url: str, **kv: str) -> str:
+    # alle Parameter in einem Durchgang setzen (nur ein Parse/Unparse der URL)
     s = urlsplit(url)
     q = dict(parse_qsl(s.query, keep_blank_values=True))
-    q[key] = value
+    q.update(kv)
     return urlunsplit((s.scheme, s.netloc, s.path, urlencode(q, doseq=True), s.fragment))
 
 
-def label_from_url(u: str) -> str:
+def label_from_parsed(p: ParseResult) -> str:
     """
-    Extract a nice label from common ADT paths.
+    Extract a nice label from common ADT paths (already parsed URL).
     Examples:
       /programs/programs/Z_TEST1/source/main       -> Z_TEST1
       /oo/classes/ZCL_FOO/source/main              -> ZCL_FOO
@@ -158,36 +234,19 @@ def label_from_url(u: str) -> str:
       /ddic/tables/ZTAB/source/main                -> ZTAB
     Fallback: last segments joined.
     """
-    p = urlparse(u)
     parts = [x for x in p.path.strip("/").split("/") if x]
 
-    # Helper: find token right after a marker path
-    def after(*marker):
-        for i in range(len(parts) - len(marker)):
-            if parts[i:i+len(marker)] == list(marker):
-                if i + len(marker) < len(parts):
-                    return parts[i + len(marker)]
-        return None
-
-    # Common ADT patterns
-    name = (
-        after("programs", "programs") or
-        after("oo", "classes") or
-        after("oo", "interfaces") or
-        after("ddic", "tables") or
-        after("ddic", "structures") or
-        after("ddic", "dataelements") or
-        after("ddic", "domains")
-    )
-
-    if name:
-        return safe_filename(name)
+    # Common ADT patterns: single pass, token right after a marker pair
+    for i, (a, b) in enumerate(zip(parts, parts[1:])):
+        second = _ADT_MARKER_SECOND.get(a)
+        if second and b in second and i + 2 < len(parts):
+            return safe_filename(parts[i + 2])
 
     # Fallback: keep something stable
     tail = parts[-4:] if len(parts) >= 4 else parts
     return safe_filename("_".join(tail))
 
-def adt_activate(session: requests.Session, base: str, obj_url: str, client: str, csrf_token: str, corrnr: str):
+def adt_activate(session: httpx.Client, base: str, obj_url: str, client: str, corrnr: str):
     """
     Aktiviert ein ADT-Objekt nach Writeback.
     obj_url = source/main URL (mit oder ohne Query)
@@ -196,27 +255,21 @@ def adt_activate(session: requests.Session, base: str, obj_url: str, client: str
     activation_url = obj_url.split("/source/")[0] + "/activation"
 
     # corrNr anhängen
-    activation_url = add_query_param(activation_url, "corrNr", corrnr)
+    activation_url = add_query_params(activation_url, corrNr=corrnr)
 
     h = headers(client, "application/vnd.sap.adt.errors+xml")
-    h["X-CSRF-Token"] = csrf_token
 
-    r = session.post(activation_url, headers=h)
+    r = csrf_request(session, "POST", activation_url, client, h)
     if r.status_code >= 400:
         raise RuntimeError(
-            f"ACTIVATION failed {r.status_code} {r.reason}\n"
+            f"ACTIVATION failed {r.status_code} {r.reason_phrase}\n"
             f"URL: {activation_url}\n"
-            f"Response body:\n{r.text[:4000]}"
+            f"Response body:\n{body_head(r)}"
         )
 
 def read_urls_file(path: Path) -> list[str]:
-    urls: list[str] = []
-    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
-        s = line.strip()
-        if not s or s.startswith("#"):
-            continue
-        urls.append(s)
-    return urls
+    text = path.read_text(encoding="utf-8", errors="replace")
+    return [s for line in text.splitlines() if (s := line.strip()) and not s.startswith("#")]
 
 
 def build_source_items(base: str, url_args: list[str], urls_file: str | None) -> list[SourceItem]:
@@ -229,37 +282,23 @@ def build_source_items(base: str, url_args: list[str], urls_file: str | None) ->
             raise SystemExit(f"ERROR: urls-file nicht gefunden: {p}")
         raw.extend(read_urls_file(p))
 
-    # Dedup while preserving order
-    seen = set()
-    unique: list[str] = []
-    for u in raw:
-        if u not in seen:
-            seen.add(u)
-            unique.append(u)
+    base_dir = base.rstrip("/") + "/"
 
+    # Dedup while preserving order; each URL is parsed once for both checks
     items: list[SourceItem] = []
-    for u in unique:
-        if is_absolute_url(u):
-            full = u
-        else:
-            full = urljoin(base.rstrip("/") + "/", u.lstrip("/"))
-        items.append(SourceItem(url=full, label=label_from_url(full)))
+    for u in dict.fromkeys(raw):
+        full = u
+        p = urlparse(u)
+        if not is_absolute_url_fast(p):
+            full = urljoin(base_dir, u.lstrip("/"))
+            p = urlparse(full)
+        items.append(SourceItem(url=full, label=label_from_parsed(p)))
     return items
 
-def read_urls_file(path: Path) -> list[str]:
-    urls: list[str] = []
-    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
-        s = line.strip()
-        if not s or s.startswith("#"):
-            continue
-        urls.append(s)
-    return urls
-
 
-
-def adt_activate_via_service(session, obj_url: str, client: str, csrf_token: str, corrnr: str):
+def activation_target(obj_url: str) -> tuple[str, str]:
     """
-    Aktiviert ein ADT-Objekt per zentralem /sap/bc/adt/activation Service.
+    Liefert (URL des Activation-Service, rel_uri des Objekt-Roots) zu einer Objekt-URL.
     obj_url muss eine ABSOLUTE URL sein, z.B.:
       https://host:port/sap/bc/adt/programs/programs/Z_TEST1/source/main?version=inactive
     """
@@ -286,31 +325,99 @@ def adt_activate_via_service(session, obj_url: str, client: str, csrf_token: str
     adt_root_path = rel_uri[: idx + len(marker)]          # /sap/bc/adt
     act_path = adt_root_path + "/activation"              # /sap/bc/adt/activation
 
-    act_url = urlunparse((p.scheme, p.netloc, act_path, "", "", ""))
-    act_url = add_query_param(act_url, "method", "activate")
-    act_url = add_query_param(act_url, "corrNr", corrnr)
+    return urlunparse((p.scheme, p.netloc, act_path, "", "", "")), rel_uri
 
-    body = f"""<?xml version="1.0" encoding="UTF-8"?>
-<adtcore:objectReferences xmlns:adtcore="http://www.sap.com/adt/core">
-  <adtcore:objectReference adtcore:uri="{rel_uri}"/>
-</adtcore:objectReferences>
-"""
+
+def adt_activate_via_service(session, obj_urls: list[str], client: str, corrnr: str):
+    """
+    Aktiviert mehrere ADT-Objekte mit einem POST auf den zentralen /sap/bc/adt/activation Service.
+    obj_urls müssen ABSOLUTE URLs auf demselben Host sein (siehe activation_target).
+    """
+    targets = [activation_target(u) for u in obj_urls]
+    act_urls = {act for act, _ in targets}
+    if len(act_urls) != 1:
+        raise ValueError(f"Objekte müssen auf genau einem ADT-Host liegen: {sorted(act_urls)}")
+
+    act_url = add_query_params(act_urls.pop(), method="activate", corrNr=corrnr)
+    rel_uris = [rel_uri for _, rel_uri in targets]
+
+    body = _ACT_XML_PREFIX + b"".join(
+        b'  <adtcore:objectReference adtcore:uri="'
+        + xml_escape(rel_uri, {'"': "&quot;"}).encode("utf-8")
+        + b'"/>\n'
+        for rel_uri in rel_uris
+    ) + _ACT_XML_SUFFIX
 
     h = headers(client, "application/vnd.sap.adt.errors+xml, application/xml, */*")
     h["Content-Type"] = "application/vnd.sap.adt.core.objectreferences+xml; charset=utf-8"
-    h["X-CSRF-Token"] = csrf_token
 
-    r = session.post(act_url, headers=h, data=body.encode("utf-8"))
+    # HTTP_TIMEOUT gilt für die Aktivierung eines Objekts; ein Batch bekommt mehr Zeit, gedeckelt
+    timeout = min(HTTP_TIMEOUT * len(rel_uris), ACTIVATION_TIMEOUT_MAX)
+    r = csrf_request(session, "POST", act_url, client, h, body, timeout=timeout)
     if r.status_code >= 400:
         raise RuntimeError(
-            f"ACTIVATION failed {r.status_code} {r.reason}\n"
+            f"ACTIVATION failed {r.status_code} {r.reason_phrase}\n"
             f"act_url: {act_url}\n"
-            f"rel_uri: {rel_uri}\n"
-            f"Response body:\n{r.text[:4000]}"
+            f"rel_uris: {', '.join(rel_uris)}\n"
+            f"Response body:\n{body_head(r)}"
         )
     return r
 
 
+def write_failure_logs(log_q: queue.Queue, fail_log: Path, fail_json: Path, errors: list):
+    """
+    Consumer: schreibt (entry, msg) aus der Queue ins txt- und jsonl-Log, bis None kommt.
+    Die Dateien werden erst beim ersten Fehler angelegt und bleiben dann offen (gepuffert).
+    Fehler beim Schreiben landen in errors, damit main() sie nach join() melden kann.
+    """
+    log_fh = json_fh = None
+    try:
+        while (job := log_q.get()) is not None:
+            entry, msg = job
+
+            if log_fh is None:
+                log_fh = fail_log.open("w", encoding="utf-8", buffering=1 << 16)
+                json_fh = fail_json.open("w", encoding="utf-8", buffering=1 << 16)
+
+            # txt log (human readable)
+            log_fh.write(f"---\nLABEL: {entry['label']}\nURL: {entry['url']}\n")
+            if entry["lock_corrnr"]:
+                log_fh.write(f"LOCKED_IN: {entry['lock_corrnr']}\n")
+            log_fh.write(f"ERROR:\n{msg}\n")
+
+            # jsonl log (maschinenlesbar)
+            json_fh.write(_dumps(entry) + "\n")
+    except Exception as e:
+        errors.append(e)
+        # Queue trotzdem bis zum Ende leeren; die Einträge gibt main() dann auf der Konsole aus
+        while log_q.get() is not None:
+            pass
+    finally:
+        for fh in (log_fh, json_fh):
+            if fh is None:
+                continue
+            try:
+                fh.close()
+            except OSError as e:
+                # z.B. Platte voll beim Flush des Puffers
+                errors.append(e)
+
+
+def remove_old_outdirs(outdir: Path):
+    """
+    Löscht von diesem Skript umbenannte Output-Ordner (<outdir>.old.<run_id>), auch Reste früherer Läufe.
+    Nur exakt dieses Namensschema, damit z.B. ein manuelles "outputs.old.backup" erhalten bleibt.
+    """
+    old_re = re.compile(re.escape(outdir.name) + r"\.old\.\d{8}_\d{6}")
+    try:
+        old_dirs = [d for d in outdir.parent.iterdir() if old_re.fullmatch(d.name) and d.is_dir()]
+    except OSError:
+        # Parent nicht lesbar -> nichts aufzuräumen, der eigentliche Lauf soll daran nicht scheitern
+        return
+    for old_dir in old_dirs:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--base", required=True, help="Base ADT URL, e.g. https://host:port")
@@ -350,10 +457,24 @@ def main():
     help="Transport request number (corrNr), e.g. DEVK900123. Required for writeback on many systems."
     )
 
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Number of objects processed in parallel (default: min({WORKERS_MAX_DEFAULT}, number of URLs))."
+    )
+
     args = ap.parse_args()
 
-    if args.insecure:
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    # Einmalig vor dem Lauf prüfen statt pro Objekt (scheitert sonst für jedes Item gleich)
+    cleaner = Path(args.cleaner)
+    profile = Path(args.profile)
+    if not cleaner.exists():
+        raise SystemExit(f"ERROR: Cleaner nicht gefunden: {cleaner}")
+    if not profile.exists():
+        raise SystemExit(f"ERROR: Profil nicht gefunden: {profile}")
+    if args.mode in ("writeback", "writeback_noact") and not args.corrnr:
+        raise SystemExit("ERROR: --corrnr ist im writeback Modus erforderlich.")
 
     user = os.getenv("SAP_USER")
     pw = os.getenv("SAP_PASS")
@@ -362,14 +483,24 @@ def main():
 
     base = args.base.rstrip("/")
 
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
     outdir = Path(args.outdir)
 
     if outdir.exists():
         print(f"[info] cleaning output dir: {outdir}")
-        shutil.rmtree(outdir)
+        try:
+            # Nur umbenennen (ein Syscall); das eigentliche Löschen läuft im Hintergrund
+            outdir.rename(outdir.with_name(f"{outdir.name}.old.{run_id}"))
+        except OSError:
+            # z.B. offene Handles unter Windows -> synchron löschen wie bisher
+            shutil.rmtree(outdir)
 
     outdir.mkdir(parents=True, exist_ok=True)
 
+    # erst nach mkdir starten (Parent existiert dann sicher);
+    # räumt auch Reste früherer Läufe ab, falls deren Hintergrund-Löschen abgebrochen wurde
+    threading.Thread(target=remove_old_outdirs, args=(outdir,), daemon=True).start()
+
 
     items = build_source_items(base, args.url, args.urls_file)
     if not items:
@@ -381,95 +512,166 @@ def main():
             "  --urls-file urls.txt"
         )
 
-    s = requests.Session()
-    s.auth = (user, pw)
-    s.verify = (not args.insecure)
+    workers = args.workers if args.workers is not None else min(WORKERS_MAX_DEFAULT, len(items))
+    if workers < 1:
+        raise SystemExit("ERROR: --workers muss >= 1 sein.")
+
+    # HTTP/2: alle Worker teilen sich eine TLS-Verbindung (Multiplexing statt Handshake je Request)
+    s = httpx.Client(
+        http2=True,
+        auth=(user, pw),
+        verify=(not args.insecure),
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=workers * 2, max_keepalive_connections=workers * 2),
+    )
 
-    csrf_token = None
     if args.mode in ("writeback", "writeback_noact"):
-        csrf_token = fetch_csrf_token(s, items[0].url, args.client)
+        # Token einmal vorab holen (fail fast); danach wird er an der Session wiederverwendet
+        get_csrf(s, items[0].url, args.client)
 
-    ok = 0
     fail = 0
 
     print(f"[info] mode: {args.mode}")
     print(f"[info] items: {len(items)}")
+    print(f"[info] workers: {workers}")
 
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
     fail_log = outdir / f"failures_{run_id}.txt"
     fail_json = outdir / f"failures_{run_id}.jsonl" 
     retry_file = outdir / f"retry_urls_{run_id}.txt"
 
     failures = []
-    retry_urls = []
+    failed_urls = set()
+    succeeded_urls = set()
+
+    # Failure-Logs schreibt ein Hintergrund-Thread; Worker legen Einträge nur in die Queue
+    log_q = queue.Queue()
+    log_errors = []
+    log_writer = threading.Thread(
+        target=write_failure_logs, args=(log_q, fail_log, fail_json, log_errors), daemon=True
+    )
+    log_writer.start()
 
-    for it in items:
+    def process_item(it: SourceItem) -> tuple[bool, dict | None]:
         try:
+            # GET im Worker: die GETs der Worker laufen parallel und überlappen mit den Cleaner-Läufen der anderen
             source, etag = adt_get_text_and_etag(s, it.url, args.client)
-            cleaned = run_cleaner(args.cleaner, Path(args.profile), args.release, source)
+            cleaned = run_cleaner(args.cleaner, profile, args.release, source)
 
             if args.mode == "test":
-                out_path = outdir / f"{safe_filename(it.label)}.abap"
+                out_path = outdir / (it.label + ".abap")
                 out_path.write_text(cleaned, encoding="utf-8")
                 print(f"[ok] TEST  {it.url} -> {out_path}")
 
             else:
                 # writeback / writeback_noact
-                assert csrf_token is not None
+                put_url = add_query_params(it.url, corrNr=args.corrnr)
 
-                if not args.corrnr:
-                    raise SystemExit("ERROR: --corrnr ist im writeback Modus erforderlich.")
-
-                put_url = add_query_param(it.url, "corrNr", args.corrnr)
-
-                adt_put_text(s, put_url, args.client, cleaned, csrf_token, etag)
+                adt_put_text(s, put_url, args.client, cleaned, etag)
                 print(f"[ok] WRITE {put_url} -> updated on server")
 
-                if args.mode == "writeback":
-                    adt_activate_via_service(s, it.url, args.client, csrf_token, args.corrnr)
-                    print(f"[ok] ACTIVATE {it.label}")
-
-            ok += 1
+            return True, None
         except Exception as e:
-            msg = str(e)
+            return False, record_failure(it, e)
 
-            # ADT lock corrNr rausziehen, falls vorhanden
-            m_lock = re.search(r"locked in request\s+([A-Z0-9]{10})", msg)
-            lock_corrnr = m_lock.group(1) if m_lock else None
+    def record_failure(it: SourceItem, e: Exception) -> dict:
+        msg = str(e)
 
-            entry = {
-                "label": it.label,
-                "url": it.url,
-                "error": msg[:4000],
-                "lock_corrnr": lock_corrnr,
-            }
-            failures.append(entry)
-            retry_urls.append(it.url)
+        # ADT lock corrNr rausziehen, falls vorhanden
+        m_lock = _LOCK_CORRNR_RE.search(msg)
+        lock_corrnr = m_lock.group(1) if m_lock else None
 
-            print(f"[fail] {it.url} ")
+        entry = {
+            "label": it.label,
+            "url": it.url,
+            "error": msg[:4000],
+            "lock_corrnr": lock_corrnr,
+        }
 
-            # txt log (human readable)
-            with fail_log.open("a", encoding="utf-8") as f:
-                f.write(f"---\nLABEL: {it.label}\nURL: {it.url}\n")
-                if lock_corrnr:
-                    f.write(f"LOCKED_IN: {lock_corrnr}\n")
-                f.write(f"ERROR:\n{msg}\n")
+        print(f"[fail] {it.url} ")
 
-            # jsonl log (maschinenlesbar)
-            with fail_json.open("a", encoding="utf-8") as f:
-                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        log_q.put((entry, msg))
+        return entry
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(process_item, it): it for it in items}
+            try:
+                for fut in as_completed(futures):
+                    success, entry = fut.result()
+                    if success:
+                        succeeded_urls.add(futures[fut].url)
+                    else:
+                        failures.append(entry)
+                        failed_urls.add(entry["url"])
+                        fail += 1
+            except BaseException:
+                # z.B. Ctrl-C: noch nicht gestartete Items verwerfen, sonst würde weiter zurückgeschrieben
+                ex.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        # Aktivierung gesammelt nach dem Writeback: ein POST je Chunk statt je Objekt
+        if args.mode == "writeback":
+            written = [it for it in items if it.url in succeeded_urls]
+            for i in range(0, len(written), ACTIVATION_CHUNK_SIZE):
+                chunk = written[i:i + ACTIVATION_CHUNK_SIZE]
+                try:
+                    adt_activate_via_service(s, [it.url for it in chunk], args.client, args.corrnr)
+                    activated = chunk
+                except httpx.TimeoutException as e:
+                    # Server arbeitet evtl. noch am Batch -> nicht sofort einzeln nachaktivieren
+                    # (Lock-Fehler/Doppelaktivierung); der ganze Chunk gilt als fehlgeschlagen
+                    activated = []
+                    err = RuntimeError(f"ACTIVATION timeout (Batch mit {len(chunk)} Objekten): {e}")
+                    for it in chunk:
+                        entry = record_failure(it, err)
+                        failures.append(entry)
+                        failed_urls.add(it.url)
+                        succeeded_urls.discard(it.url)
+                        fail += 1
+                except Exception:
+                    # Batch fehlgeschlagen -> einzeln aktivieren, damit Fehler dem Objekt zugeordnet werden
+                    activated = []
+                    for it in chunk:
+                        try:
+                            adt_activate_via_service(s, [it.url], args.client, args.corrnr)
+                            activated.append(it)
+                        except Exception as e:
+                            entry = record_failure(it, e)
+                            failures.append(entry)
+                            failed_urls.add(it.url)
+                            succeeded_urls.discard(it.url)
+                            fail += 1
+
+                for it in activated:
+                    print(f"[ok] ACTIVATE {it.label}")
+    finally:
+        # Ende signalisieren und warten, bis alle Einträge geschrieben und die Dateien geschlossen sind
+        log_q.put(None)
+        log_writer.join()
 
-            fail += 1
-            continue
+    s.close()
+
+    # Retry-Datei in Eingabereihenfolge, unabhängig von der Abschlussreihenfolge der Worker
+    retry_urls = [it.url for it in items if it.url in failed_urls]
 
     if retry_urls:
         retry_file.write_text("\n".join(retry_urls) + "\n", encoding="utf-8")
 
-    print(f"[info] failure log: {fail_log}")
-    print(f"[info] failure jsonl: {fail_json}")
+    if log_errors:
+        # Failure-Log unvollständig -> Einträge nicht stillschweigend verlieren, sondern hier ausgeben
+        print(f"[warn] failure log konnte nicht geschrieben werden: {log_errors[0]!r}")
+        for entry in failures:
+            print(f"[fail-entry] {entry['label']} {entry['url']}\n{entry['error']}")
+    else:
+        print(f"[info] failure log: {fail_log}")
+        print(f"[info] failure jsonl: {fail_json}")
     print(f"[info] retry urls: {retry_file}")
 
-    print(f"\nDONE: ok={ok} fail={fail} outdir={outdir}")
+    print(f"\nDONE: ok={len(succeeded_urls)} fail={fail} outdir={outdir}")
+
+    if log_errors:
+        raise SystemExit(f"ERROR: Failure-Log unvollständig ({fail_log}, {fail_json}): {log_errors[0]}")
 
 
 if __name__ == "__main__":